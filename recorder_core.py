@@ -0,0 +1,442 @@
+import asyncio
+import multiprocessing
+import os
+import struct
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from numba import njit
+from multiprocessing import shared_memory
+from datetime import datetime, timedelta
+
+
+COLUMNS = (
+    ("ts", np.int64),
+    ("security_id", np.uint16),
+    ("side", np.uint8),
+    ("price", np.float64),
+    ("qty", np.int32)
+)
+
+SIDE_CODES = {"Bid": 0, "Ask": 1}
+SIDE_NAMES = pa.array(["Bid", "Ask"])
+
+# Dhan 20-depth feed framing, see FullDepth.process_data
+FEED_HEADER = struct.Struct("<hBBiI")
+FEED_LEVEL = np.dtype([("price", "<f8"), ("qty", "<u4"), ("orders", "<u4")])
+FEED_SIDES = {41: SIDE_CODES["Bid"], 51: SIDE_CODES["Ask"]}
+FEED_DISCONNECT = 50
+FEED_LEVELS = 20
+FEED_SCRATCH_ROWS = 64
+# websockets caps a frame at 1 MiB, so one append never exceeds this many rows and
+# the ring must hold at least that many
+MAX_FRAME_ROWS = (1 << 20) // FEED_LEVEL.itemsize
+
+# frames buffered between the socket and the parser before new ones are dropped
+RAW_QUEUE_SIZE = 4096
+
+# spawn, not fork: the recorder usually runs inside a threaded Jupyter kernel
+MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# ~256 KB of rows per row group, so one group's columns encode inside L2
+ROW_GROUP_SIZE = 16_384
+# prices move in small steps, so split float bytes compress far better; ts and qty are
+# near-monotonic integers that delta-pack well
+PARQUET_OPTIONS = dict(
+    compression="zstd",
+    compression_level=6,
+    use_dictionary=["security_id", "side"],
+    # byte stream split is named here rather than through use_byte_stream_split, which
+    # pyarrow merges into this dict and then rejects on the next writer
+    column_encoding={
+        "ts": "DELTA_BINARY_PACKED",
+        "price": "BYTE_STREAM_SPLIT",
+        "qty": "DELTA_BINARY_PACKED"
+    },
+    data_page_size=1 << 20
+)
+# encoded pages are staged here and reach the file in a few large writes
+WRITE_BUFFER_SIZE = 8 << 20
+
+
+def _aligned(nbytes, alignment=64):
+    return -(-nbytes // alignment) * alignment
+
+
+@njit(cache=True, boundscheck=False)
+def _ring_write(ts_col, sid_col, side_col, price_col, qty_col, size, write_idx,
+                ts, sid_ids, side_codes, prices, qtys):
+    # size is a power of two, so wrapping is a mask instead of a division
+    mask = size - 1
+    for i in range(prices.size):
+        idx = (write_idx + i) & mask
+        ts_col[idx] = ts
+        sid_col[idx] = sid_ids[i]
+        side_col[idx] = side_codes[i]
+        price_col[idx] = prices[i]
+        qty_col[idx] = qtys[i]
+    return (write_idx + prices.size) & mask
+
+
+class RingBuffer:
+    def __init__(self, size, columns=COLUMNS, shm_name=None):
+        # rounded up to a power of two so wrapping an index is a mask
+        size = 1 << (size - 1).bit_length()
+        if size < MAX_FRAME_ROWS:
+            raise ValueError(f"ring of {size} rows cannot hold one {MAX_FRAME_ROWS}-row frame")
+        # columns live in one shared memory block so the writer process can attach to them
+        spans = [_aligned(size * np.dtype(dtype).itemsize) for _, dtype in columns]
+        header = _aligned(np.dtype(np.int64).itemsize)
+        self.owner = shm_name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=header + sum(spans))
+        else:
+            self.shm = shared_memory.SharedMemory(name=shm_name)
+
+        # rows claimed so far, published before each batch is written so the writer
+        # process can tell which rows it copied may have been overwritten
+        self.claimed = np.ndarray(1, dtype=np.int64, buffer=self.shm.buf)
+        if self.owner:
+            self.claimed[0] = 0
+
+        self.columns = {}
+        offset = header
+        for (name, dtype), span in zip(columns, spans):
+            self.columns[name] = np.ndarray(size, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            offset += span
+
+        self.size = size
+        self.mask = size - 1
+        self.write_idx = 0
+        self.total = 0
+        self.sid_vocab = {}
+
+    def append_batch(self, n, ts, sid_ids, side_codes, prices, qtys):
+        cols = self.columns
+        self.claimed[0] = self.total + n
+        self.write_idx = _ring_write(
+            cols["ts"], cols["security_id"], cols["side"], cols["price"], cols["qty"],
+            self.size, self.write_idx,
+            ts, sid_ids[:n], side_codes[:n], prices[:n], qtys[:n]
+        )
+        self.total += n
+
+    def snapshot(self, since=0, total=None):
+        # rows appended after the first `since` ones, capped to what is still buffered
+        if total is None:
+            total = self.total
+        since = max(since, total - self.size)
+        start = since & self.mask
+        end = start + total - since
+
+        if end <= self.size:
+            return {name: col[start:end] for name, col in self.columns.items()}
+        return {
+            name: np.concatenate((col[start:self.size], col[:total & self.mask]))
+            for name, col in self.columns.items()
+        }
+
+    def close(self):
+        # views into the block must be gone before it can be closed
+        self.columns = {}
+        self.claimed = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class FeedAdapter:
+    def __init__(self, fd, sid_vocab):
+        self.fd = fd
+        self.sid_vocab = sid_vocab
+        self._reserve(FEED_SCRATCH_ROWS)
+
+    def _reserve(self, rows):
+        # scratch columns reused across frames; only grows for unusually large frames
+        self._scratch_sid = np.empty(rows, dtype=np.uint16)
+        self._scratch_side = np.empty(rows, dtype=np.uint8)
+        self._scratch_price = np.empty(rows, dtype=np.float64)
+        self._scratch_qty = np.empty(rows, dtype=np.int32)
+
+    def process_data_batch(self, raw):
+        # parse every depth message in a frame straight into ring-ready columns
+        max_rows = len(raw) // FEED_LEVEL.itemsize
+        if max_rows > self._scratch_price.size:
+            self._reserve(max_rows)
+
+        rows = 0
+        offset = 0
+
+        while offset + FEED_HEADER.size <= len(raw):
+            msg_length, msg_code, _, security_id, _ = FEED_HEADER.unpack_from(raw, offset)
+            # a length shorter than its own header is malformed; stop rather than misparse
+            if msg_length < FEED_HEADER.size or offset + msg_length > len(raw):
+                break
+
+            if msg_code not in FEED_SIDES:
+                if msg_code == FEED_DISCONNECT:
+                    self.fd.server_disconnection(raw[offset:offset + msg_length])
+                break
+
+            n = min((msg_length - FEED_HEADER.size) // FEED_LEVEL.itemsize, FEED_LEVELS)
+            if n:
+                levels = np.frombuffer(raw, FEED_LEVEL, count=n, offset=offset + FEED_HEADER.size)
+                end = rows + n
+                self._scratch_sid[rows:end] = self.sid_vocab.setdefault(
+                    security_id, len(self.sid_vocab)
+                )
+                self._scratch_side[rows:end] = FEED_SIDES[msg_code]
+                self._scratch_price[rows:end] = levels["price"]
+                self._scratch_qty[rows:end] = levels["qty"]
+                rows = end
+
+            offset += msg_length
+
+        if not rows:
+            return None
+
+        return (
+            rows,
+            self._scratch_sid,
+            self._scratch_side,
+            self._scratch_price,
+            self._scratch_qty
+        )
+
+
+class ParquetFlusher:
+    def __init__(self, ring, output_path):
+        self.ring = ring
+        self.output_path = output_path
+        self.writer = None
+        self.sink = None
+        self.file_path = None
+        self.writer_hour = None
+
+    def to_table(self, columns, sid_vocab):
+        # each column wraps the copied numpy buffer without re-encoding it
+        return pa.Table.from_arrays([
+            pa.array(columns["ts"], pa.timestamp("ns", tz="UTC")),
+            pa.DictionaryArray.from_arrays(
+                columns["security_id"],
+                pa.array([str(sid) for sid in sid_vocab])
+            ),
+            pa.DictionaryArray.from_arrays(columns["side"], SIDE_NAMES),
+            pa.array(columns["price"]),
+            pa.array(columns["qty"])
+        ], names=list(columns))
+
+    def open_writer(self, schema, hour):
+        self.file_path = self.output_path(hour)
+        dir_path = os.path.dirname(self.file_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+
+        # a restart within the same hour gets its own part instead of clobbering the file
+        root, ext = os.path.splitext(self.file_path)
+        part = 1
+        while os.path.exists(self.file_path):
+            self.file_path = f"{root}_{part}{ext}"
+            part += 1
+
+        self.writer_hour = hour
+        self.sink = pa.output_stream(self.file_path, buffer_size=WRITE_BUFFER_SIZE)
+        self.writer = pq.ParquetWriter(self.sink, schema, **PARQUET_OPTIONS)
+
+    def take_snapshot(self, since, total):
+        # copy out of the ring first so the recorder can keep writing while we encode;
+        # a wrapped snapshot is already a fresh concatenation and needs no second copy
+        snapshot = self.ring.snapshot(since, total)
+        columns = {
+            name: col.copy() if col.base is not None else col
+            for name, col in snapshot.items()
+        }
+
+        # rows the recorder may have lapped while we copied are dropped, not written torn;
+        # checked after the copy, against everything claimed so far including a write
+        # still in progress
+        first = max(since, total - self.ring.size)
+        if first > since:
+            # more rows arrived since the last flush than the ring holds
+            print(f"Ring overflowed between flushes, lost {first - since} rows")
+        lapped = min(int(self.ring.claimed[0]) - self.ring.size, total) - first
+        if lapped > 0:
+            print(f"Ring overran the writer, dropping {lapped} rows")
+            columns = {name: col[lapped:] for name, col in columns.items()}
+        return columns
+
+    def write_snapshot(self, since, total, sid_vocab):
+        columns = self.take_snapshot(since, total)
+        n_rows = len(columns["ts"])
+        if n_rows == 0:
+            return
+
+        table = self.to_table(columns, sid_vocab)
+
+        # one file per hour; receive timestamps only grow, so a batch that crosses an
+        # hour boundary splits where the next hour begins
+        ts = columns["ts"]
+        start = 0
+        while start < n_rows:
+            hour = datetime.fromtimestamp(ts[start] / 1e9).replace(
+                minute=0, second=0, microsecond=0
+            )
+            next_hour = int((hour + timedelta(hours=1)).timestamp()) * 1_000_000_000
+            end = max(int(np.searchsorted(ts, next_hour, side="left")), start + 1)
+
+            if self.writer is not None and hour != self.writer_hour:
+                self.close_writer()
+            if self.writer is None:
+                self.open_writer(table.schema, hour)
+
+            self.writer.write_table(table.slice(start, end - start), row_group_size=ROW_GROUP_SIZE)
+
+            print(f"Wrote {end - start} rows → {self.file_path}")
+            start = end
+
+    def close_writer(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+            self.writer = None
+            self.sink = None
+
+
+def _pin_to_core(cores):
+    # cores is one core or a set of them; returns the affinity it replaced, or None if
+    # nothing changed. sched_setaffinity only exists on Linux; elsewhere leave placement
+    # to the scheduler
+    if cores is None or not hasattr(os, "sched_setaffinity"):
+        return None
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, {cores} if isinstance(cores, int) else cores)
+    return previous
+
+
+def _writer_main(shm_name, size, output_path, commands, cores):
+    # runs in the writer process: attach to the ring and write each requested row range
+    _pin_to_core(cores)
+    ring = RingBuffer(size, shm_name=shm_name)
+    flusher = ParquetFlusher(ring, output_path)
+    try:
+        for command in iter(commands.get, None):
+            flusher.write_snapshot(*command)
+    finally:
+        flusher.close_writer()
+        ring.close()
+
+
+class MarketRecorder:
+    # output_path(hour) -> file path for that hour; it runs in the writer process,
+    # so it must be a module-level function.
+    # writer_core may be one core or a set of them
+    def __init__(self, fd, output_path, buffer_size=2 ** 21, flush_interval=300,
+                 recv_core=None, writer_core=None):
+        self.fd = fd
+        self.output_path = output_path
+        self.ring = RingBuffer(buffer_size)
+        self.feed = FeedAdapter(fd, self.ring.sid_vocab)
+        self.raw_queue = asyncio.Queue(maxsize=RAW_QUEUE_SIZE)
+        self.dropped_frames = 0
+        self.flush_interval = flush_interval
+        self.last_flush_idx = 0
+        self.flush_commands = MP_CONTEXT.Queue()
+        self.writer_process = None
+        self.recv_core = recv_core
+        self.writer_core = writer_core
+
+    async def market_data_loop(self):
+        # only receive here, so parsing or ring stalls never backpressure the socket
+        await self.fd.connect()
+
+        while True:
+            raw = await self.fd.ws.recv()
+            try:
+                self.raw_queue.put_nowait((time.time_ns(), raw))
+            except asyncio.QueueFull:
+                self.dropped_frames += 1
+
+    def ingest(self, ts, raw):
+        batch = self.feed.process_data_batch(raw)
+        if batch is None:
+            return
+
+        n, sid_ids, side_codes, prices, qtys = batch
+        self.ring.append_batch(n, ts, sid_ids, side_codes, prices, qtys)
+
+    async def parse_loop(self):
+        while True:
+            self.ingest(*await self.raw_queue.get())
+
+    def start_writer(self):
+        self.writer_process = MP_CONTEXT.Process(
+            target=_writer_main,
+            args=(
+                self.ring.shm.name,
+                self.ring.size,
+                self.output_path,
+                self.flush_commands,
+                self.writer_core
+            ),
+            name="parquet-writer",
+            daemon=True
+        )
+        self.writer_process.start()
+
+    def request_flush(self):
+        # nothing else reads the queue, so a dead writer would silently drop every flush
+        if not self.writer_process.is_alive():
+            raise RuntimeError(
+                f"Parquet writer process exited with code {self.writer_process.exitcode}"
+            )
+        # only the row range and vocabulary cross the process boundary, never the rows
+        total = self.ring.total
+        self.flush_commands.put((self.last_flush_idx, total, list(self.ring.sid_vocab)))
+        self.last_flush_idx = total
+
+    async def parquet_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self.dropped_frames:
+                print(f"Dropped {self.dropped_frames} frames so far, parser falling behind")
+            self.request_flush()
+
+    async def run(self):
+        previous_cores = None
+        tasks = []
+        try:
+            # inside the try so a writer that fails to spawn still releases the ring
+            self.start_writer()
+            # recv and parse share the event loop thread, keep it (and the ring) on one core
+            previous_cores = _pin_to_core(self.recv_core)
+            tasks = [
+                asyncio.create_task(self.market_data_loop()),
+                asyncio.create_task(self.parse_loop()),
+                asyncio.create_task(self.parquet_flush())
+            ]
+            await asyncio.gather(*tasks)
+        finally:
+            print("Stopping recorder, flushing remaining data...")
+            # gather leaves the other loops running when one fails, stop them before the ring goes
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            started = self.writer_process is not None and self.writer_process.pid is not None
+            try:
+                if started:
+                    while not self.raw_queue.empty():
+                        self.ingest(*self.raw_queue.get_nowait())
+                    self.request_flush()
+            finally:
+                try:
+                    if started:
+                        # the writer drains every queued flush before it sees the stop marker
+                        self.flush_commands.put(None)
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, self.writer_process.join
+                        )
+                finally:
+                    self.ring.close()
+                    if previous_cores is not None:
+                        os.sched_setaffinity(0, previous_cores)
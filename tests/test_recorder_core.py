@@ -0,0 +1,139 @@
+import struct
+from datetime import datetime
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+
+from recorder_core import FEED_LEVELS, MAX_FRAME_ROWS, FeedAdapter, ParquetFlusher, RingBuffer
+
+
+def message(code, security_id, levels, length=None):
+    body = b"".join(struct.pack("<dII", price, qty, 1) for price, qty in levels)
+    if length is None:
+        length = 12 + len(body)
+    return struct.pack("<hBBiI", length, code, 2, security_id, 0) + body
+
+
+class FakeFeed:
+    def __init__(self):
+        self.disconnects = []
+
+    def server_disconnection(self, data):
+        self.disconnects.append(bytes(data))
+
+
+def parse(raw):
+    sid_vocab = {}
+    batch = FeedAdapter(FakeFeed(), sid_vocab).process_data_batch(raw)
+    if batch is None:
+        return None, sid_vocab
+    n, sid_ids, side_codes, prices, qtys = batch
+    columns = (sid_ids, side_codes, prices, qtys)
+    return tuple(col[:n].tolist() for col in columns), sid_vocab
+
+
+@pytest.fixture
+def ring():
+    ring = RingBuffer(MAX_FRAME_ROWS)
+    yield ring
+    ring.close()
+
+
+def append_rows(ring, first, n, ts=0):
+    # qty carries the absolute row number so snapshots can be checked by value
+    ring.append_batch(
+        n,
+        ts,
+        np.zeros(n, dtype=np.uint16),
+        np.zeros(n, dtype=np.uint8),
+        np.zeros(n, dtype=np.float64),
+        np.arange(first, first + n, dtype=np.int32)
+    )
+
+
+def test_process_data_batch_reads_bid_and_ask_messages():
+    raw = message(41, 51714, [(100.0, 5), (99.5, 7)]) + message(51, 51715, [(100.5, 3)])
+    (sid_ids, sides, prices, qtys), sid_vocab = parse(raw)
+
+    assert sid_vocab == {51714: 0, 51715: 1}
+    assert sid_ids == [0, 0, 1]
+    assert sides == [0, 0, 1]
+    assert prices == [100.0, 99.5, 100.5]
+    assert qtys == [5, 7, 3]
+
+
+def test_process_data_batch_caps_levels_per_message():
+    levels = [(100.0 + i, i) for i in range(FEED_LEVELS + 5)]
+    raw = message(41, 51714, levels) + message(51, 51714, [(200.0, 1)])
+    (_, sides, prices, _), _ = parse(raw)
+
+    assert len(prices) == FEED_LEVELS + 1
+    assert prices[:FEED_LEVELS] == [price for price, _ in levels[:FEED_LEVELS]]
+    assert sides[-1] == 1
+
+
+@pytest.mark.parametrize("length", [-1, 0, 1, 11])
+def test_process_data_batch_stops_on_malformed_length(length):
+    raw = message(41, 51714, [(100.0, 5)]) + message(51, 51714, [(101.0, 6)], length=length)
+    (_, _, prices, _), _ = parse(raw)
+
+    assert prices == [100.0]
+
+
+def test_process_data_batch_stops_on_truncated_message():
+    raw = message(41, 51714, [(100.0, 5)]) + message(51, 51714, [(101.0, 6), (102.0, 7)])[:-8]
+    (_, _, prices, _), _ = parse(raw)
+
+    assert prices == [100.0]
+
+
+def test_process_data_batch_stops_on_unknown_code():
+    raw = message(99, 51714, [(100.0, 5)]) + message(41, 51714, [(101.0, 6)])
+
+    assert parse(raw) == (None, {})
+
+
+def test_process_data_batch_reports_disconnection():
+    feed = FakeFeed()
+    disconnect = message(50, 51714, [])
+
+    assert FeedAdapter(feed, {}).process_data_batch(disconnect) is None
+    assert feed.disconnects == [disconnect]
+
+
+def test_ring_rejects_sizes_below_one_frame():
+    with pytest.raises(ValueError):
+        RingBuffer(MAX_FRAME_ROWS // 2)
+
+
+def test_snapshot_returns_rows_across_the_wrap(ring):
+    append_rows(ring, 0, ring.size - 10)
+    append_rows(ring, ring.size - 10, 30)
+
+    snapshot = ring.snapshot(ring.size - 20, ring.total)
+
+    assert snapshot["qty"].tolist() == list(range(ring.size - 20, ring.size + 20))
+
+
+def test_snapshot_keeps_only_the_last_size_rows(ring):
+    append_rows(ring, 0, ring.size)
+    append_rows(ring, ring.size, 100)
+
+    snapshot = ring.snapshot(0, ring.total)
+
+    assert snapshot["qty"].tolist() == list(range(100, ring.size + 100))
+
+
+def test_write_snapshot_splits_at_the_hour(ring, tmp_path):
+    ring.sid_vocab[51714] = 0
+    start = int(datetime(2026, 2, 16, 9, 59, 50).timestamp())
+    for second in range(20):
+        append_rows(ring, second * 3, 3, ts=(start + second) * 1_000_000_000)
+
+    flusher = ParquetFlusher(ring, lambda hour: str(tmp_path / hour.strftime("%H.parquet")))
+    flusher.write_snapshot(0, ring.total, list(ring.sid_vocab))
+    flusher.close_writer()
+
+    assert pq.read_table(tmp_path / "09.parquet").column("qty").to_pylist() == list(range(30))
+    assert pq.read_table(tmp_path / "10.parquet").column("qty").to_pylist() == list(range(30, 60))